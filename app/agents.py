@@ -1,14 +1,40 @@
 import json
-from typing import TypedDict, Annotated, List, Dict, Any
+import logging
+from uuid import uuid4
+from typing import TypedDict, Annotated, List, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_ollama import ChatOllama
-from app.models import EntrepreneurState, BusinessCategory
+from app.models import EntrepreneurState, BusinessCategory, AnalystOutput, QuestionOutput
+from app.structured_output import parse_structured
+from app.checkpoint import checkpointer
+
+logger = logging.getLogger(__name__)
 
 # --- LLM Setup ---
 # Assuming 'llama3' is available in Ollama
 llm = ChatOllama(model="llama3", format="json", temperature=0)
 
+# JSON schemas passed as Ollama's `format` to constrain generation per node
+ANALYST_FORMAT = AnalystOutput.model_json_schema()
+QUESTION_FORMAT = QuestionOutput.model_json_schema()
+
+# Deterministic closing used when the entrepreneur's token budget is exhausted (no LLM call)
+BUDGET_CLOSING_MESSAGE = "¡Muchas gracias por su tiempo! Ya registramos la información de su negocio. Un mentor de Empiiu revisará su perfil y se pondrá en contacto con usted."
+# Temporary reply while the global budget is exhausted; the onboarding continues later
+BUDGET_RETRY_MESSAGE = "En este momento tenemos mucha demanda. Por favor escríbanos de nuevo en un rato para continuar con su perfil."
+
+async def invoke_llm(state, node: str, messages, **kwargs):
+    """
+    Calls the LLM and records the turn's token usage in the ledger.
+    """
+    from app.usage import record_usage
+
+    response = await llm.ainvoke(messages, **kwargs)
+    await record_usage(state['entrepreneur_id'], node, response)
+    return response
+
 # --- Graph State ---
 class AgentState(TypedDict):
     entrepreneur_id: str
@@ -19,17 +45,21 @@ class AgentState(TypedDict):
     generated_question: str
     is_category_complete: bool
     question_count: int
+    budget_exceeded: Optional[str]  # None, 'user' or 'global'
 
 # --- Node 1: Context Retriever ---
 async def context_retriever(state: AgentState):
     """
     Fetches context from the database. Ensures we only focus on the last 3 exchanges.
+    Also checks the token budgets so later nodes can skip the LLM.
     """
     from app.database import get_last_n_exchanges
+    from app.usage import exceeded_budget
     
     # Get last 3 exchanges (6 messages)
     history = await get_last_n_exchanges(state['entrepreneur_id'], n=3)
     state["conversation_history"] = history
+    state["budget_exceeded"] = await exceeded_budget(state['entrepreneur_id'])
     return state
 
 # --- Node 2: Business Analyst Agent ---
@@ -42,6 +72,9 @@ async def business_analyst(state: AgentState):
     last_msg = state['last_user_message']
     question_count = state.get("question_count", 0)
     
+    if state.get("budget_exceeded"):
+        return {"is_category_complete": False}
+
     # Force category completion if we reached the limit
     if question_count >= 15:
         return {
@@ -74,15 +107,14 @@ async def business_analyst(state: AgentState):
     }}
     """
     
-    response = await llm.ainvoke([SystemMessage(content=prompt)])
-    try:
-        content = json.loads(response.content)
-    except:
-        content = {"updated_profile_data": profile, "category_complete": False}
-        
+    response = await invoke_llm(state, "business_analyst", [SystemMessage(content=prompt)], format=ANALYST_FORMAT)
+    content = parse_structured("business_analyst", response.content, AnalystOutput)
+    if content is None:
+        return {"profile_data": profile, "is_category_complete": False}
+
     return {
-        "profile_data": content.get("updated_profile_data", profile),
-        "is_category_complete": content.get("category_complete", False)
+        "profile_data": content.updated_profile_data,
+        "is_category_complete": content.category_complete
     }
 
 # --- Node 3: Question Generator Agent ---
@@ -94,6 +126,16 @@ async def question_generator(state: AgentState):
     profile = state['profile_data']
     is_complete = state['is_category_complete']
     question_count = state.get("question_count", 0)
+
+    if state.get("budget_exceeded") == "global":
+        # Keep category and progress as they are; the user can retry later
+        return {"generated_question": BUDGET_RETRY_MESSAGE}
+    if state.get("budget_exceeded") == "user":
+        return {
+            "generated_question": BUDGET_CLOSING_MESSAGE,
+            "current_category": BusinessCategory.COMPLETED,
+            "question_count": question_count
+        }
     
     next_category = category
     if question_count >= 16:
@@ -128,7 +170,7 @@ async def question_generator(state: AgentState):
         
         Format it clearly and start with: "¡Felicidades! Hemos completado su perfil inicial. Aquí está el resumen de su proyecto:"
         """
-        response = await llm.ainvoke([SystemMessage(content=prompt)])
+        response = await invoke_llm(state, "question_generator", [SystemMessage(content=prompt)])
         return {
             "generated_question": response.content if hasattr(response, 'content') else str(response),
             "current_category": BusinessCategory.COMPLETED
@@ -187,12 +229,9 @@ async def question_generator(state: AgentState):
     }}
     """
     
-    response = await llm.ainvoke([SystemMessage(content=prompt)])
-    try:
-        content = json.loads(response.content)
-        question = content["question"]
-    except:
-        question = "¿Podría darme más detalles sobre su idea?"
+    response = await invoke_llm(state, "question_generator", [SystemMessage(content=prompt)], format=QUESTION_FORMAT)
+    content = parse_structured("question_generator", response.content, QuestionOutput)
+    question = content.question if content else "¿Podría darme más detalles sobre su idea?"
         
     return {
         "generated_question": question,
@@ -200,48 +239,96 @@ async def question_generator(state: AgentState):
         "question_count": question_count + 1
     }
 
+# --- Node 4: Turn Persistence ---
+async def persist_turn(state: AgentState, config: RunnableConfig):
+    """
+    Saves the user message, the assistant reply and the updated entrepreneur state
+    in one transaction. The write is keyed by the turn's thread, so re-running this
+    node (e.g. its checkpoint failed to save) does not store the messages twice.
+    """
+    from app.database import save_turn
+
+    thread_id = config["configurable"]["thread_id"]
+    entrepreneur_state = None
+    # Nothing was analysed while the global budget is exhausted
+    if state.get("budget_exceeded") != "global":
+        entrepreneur_state = EntrepreneurState(
+            entrepreneur_id=state['entrepreneur_id'],
+            current_category=BusinessCategory(state["current_category"]),
+            profile_data=state["profile_data"],
+            question_count=state["question_count"]
+        )
+    stored = await save_turn(
+        state['entrepreneur_id'], state["last_user_message"], state["generated_question"], entrepreneur_state,
+        turn_id=thread_id
+    )
+    if not stored:
+        logger.info(f"Turn {thread_id} was already persisted")
+    return {}
+
 # --- Graph Construction ---
 workflow = StateGraph(AgentState)
 workflow.add_node("context_retriever", context_retriever)
 workflow.add_node("business_analyst", business_analyst)
 workflow.add_node("question_generator", question_generator)
+workflow.add_node("persist_turn", persist_turn)
 workflow.set_entry_point("context_retriever")
 workflow.add_edge("context_retriever", "business_analyst")
 workflow.add_edge("business_analyst", "question_generator")
-workflow.add_edge("question_generator", END)
-app_graph = workflow.compile()
+workflow.add_edge("question_generator", "persist_turn")
+workflow.add_edge("persist_turn", END)
+app_graph = workflow.compile(checkpointer=checkpointer)
+
+def turn_thread_id(entrepreneur_id: str, message_id: str) -> str:
+    return f"{entrepreneur_id}:{message_id}"
+
+async def complete_turn(entrepreneur_id: str, message_id: str):
+    """
+    Drops a turn's checkpoint once its reply has been delivered.
+    """
+    await checkpointer.adelete_thread(turn_thread_id(entrepreneur_id, message_id))
+
+async def process_message(entrepreneur_id: str, message_text: str, message_id: Optional[str] = None):
+    """
+    Runs one turn. With a `message_id`, the turn is checkpointed under that inbound
+    message so a retry resumes after the last completed node; the caller must call
+    `complete_turn` once the reply is sent. Without one, the checkpoint is dropped
+    as soon as the graph finishes.
+    """
+    from app.database import get_entrepreneur_state
+
+    thread_id = turn_thread_id(entrepreneur_id, message_id or uuid4().hex)
+    config = {"configurable": {"thread_id": thread_id}}
+
+    snapshot = await app_graph.aget_state(config)
+    if snapshot.values and snapshot.next:
+        # A previous attempt failed mid-graph: continue from its last checkpoint
+        logger.info(f"Resuming turn {thread_id} at {', '.join(snapshot.next)}")
+        final_state = await app_graph.ainvoke(None, config)
+    elif snapshot.values:
+        # Graph already finished (only the outbound send failed)
+        final_state = snapshot.values
+    else:
+        # 1. Get State (Creates entrepreneur if not exists)
+        db_state = await get_entrepreneur_state(entrepreneur_id)
+
+        # 2. Graph Input (the user message is saved with the reply by persist_turn)
+        input_state: AgentState = {
+            "entrepreneur_id": entrepreneur_id,
+            "current_category": db_state.current_category,
+            "profile_data": db_state.profile_data,
+            "conversation_history": [], # Will be populated by retriever node
+            "last_user_message": message_text,
+            "generated_question": "",
+            "is_category_complete": False,
+            "question_count": db_state.question_count,
+            "budget_exceeded": None
+        }
+
+        # 3. Run Graph (the last node persists the messages and state)
+        final_state = await app_graph.ainvoke(input_state, config)
+
+    if message_id is None:
+        await checkpointer.adelete_thread(thread_id)
 
-async def process_message(entrepreneur_id: str, message_text: str):
-    from app.database import get_entrepreneur_state, save_entrepreneur_state, add_message
-    
-    # 1. Get State (Creates entrepreneur if not exists)
-    db_state = await get_entrepreneur_state(entrepreneur_id)
-    
-    # 2. Save User Message
-    await add_message(entrepreneur_id, "user", message_text)
-    
-    # 3. Graph Input
-    input_state: AgentState = {
-        "entrepreneur_id": entrepreneur_id,
-        "current_category": db_state.current_category,
-        "profile_data": db_state.profile_data,
-        "conversation_history": [], # Will be populated by retriever node
-        "last_user_message": message_text,
-        "generated_question": "",
-        "is_category_complete": False,
-        "question_count": db_state.question_count
-    }
-    
-    # 4. Run Graph
-    final_state = await app_graph.ainvoke(input_state)
-    
-    # 5. Save Assistant Message
-    await add_message(entrepreneur_id, "assistant", final_state["generated_question"])
-    
-    # 6. Update State
-    db_state.current_category = final_state["current_category"]
-    db_state.profile_data = final_state["profile_data"]
-    db_state.question_count = final_state.get("question_count", db_state.question_count)
-    await save_entrepreneur_state(db_state)
-    
     return final_state["generated_question"]
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete, text
+from app.database import (
+    AsyncSessionLocal, Entrepreneur, Message, MessageArchive, engine,
+    ensure_message_partitions, message_partition_name, upgrade_schema,
+    convert_messages_to_partitioned, utcnow,
+)
+from app.models import BusinessCategory
+from app.checkpoint import purge_stale_checkpoints
+
+logger = logging.getLogger(__name__)
+
+# --- Settings ---
+DEFAULT_ARCHIVE_AFTER_DAYS = 30
+DEFAULT_BATCH_SIZE = 100
+COMPRESSION_LEVEL = 9
+
+
+# --- Transcript Encoding ---
+def compress_transcript(messages: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(
+        json.dumps(messages, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        COMPRESSION_LEVEL,
+    )
+
+
+def decompress_transcript(blob: bytes) -> List[Dict[str, Any]]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+# --- Archival Job ---
+async def _archive_entrepreneur(session, entrepreneur_id: str) -> int:
+    """
+    Moves one entrepreneur's hot messages into its archive row. Returns rows moved.
+    The transcript is built from the rows the DELETE returns, so a message
+    committed concurrently is either archived or left hot, never dropped.
+    """
+    result = await session.execute(
+        delete(Message)
+        .where(Message.entrepreneur_id == entrepreneur_id)
+        .returning(Message.id, Message.role, Message.content, Message.timestamp)
+    )
+    rows = sorted(result.all(), key=lambda m: (m.timestamp, m.id))
+    if not rows:
+        return 0
+
+    transcript = [
+        {"role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()}
+        for m in rows
+    ]
+
+    archive = await session.get(MessageArchive, entrepreneur_id)
+    if archive:
+        transcript = decompress_transcript(archive.transcript) + transcript
+    else:
+        archive = MessageArchive(entrepreneur_id=entrepreneur_id, first_timestamp=rows[0].timestamp)
+        session.add(archive)
+
+    archive.transcript = compress_transcript(transcript)
+    archive.message_count = len(transcript)
+    archive.last_timestamp = rows[-1].timestamp
+    archive.archived_at = utcnow()
+    return len(rows)
+
+
+async def archive_completed_transcripts(
+    older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    now: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Archives transcripts of entrepreneurs who completed onboarding more than
+    `older_than_days` ago. Each entrepreneur is moved in its own transaction.
+    """
+    cutoff = (now or utcnow()) - timedelta(days=older_than_days)
+    stats = {"entrepreneurs": 0, "messages": 0}
+    last_id = ""
+
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Entrepreneur.id)
+                .where(
+                    Entrepreneur.current_category == BusinessCategory.COMPLETED.value,
+                    Entrepreneur.completed_at < cutoff,
+                    Entrepreneur.id > last_id,
+                )
+                .order_by(Entrepreneur.id)
+                .limit(batch_size)
+            )
+            ids = result.scalars().all()
+
+        if not ids:
+            break
+
+        for entrepreneur_id in ids:
+            async with AsyncSessionLocal() as session:
+                moved = await _archive_entrepreneur(session, entrepreneur_id)
+                await session.commit()
+            if moved:
+                stats["entrepreneurs"] += 1
+                stats["messages"] += moved
+        last_id = ids[-1]
+
+    logger.info(f"Archived {stats['messages']} messages from {stats['entrepreneurs']} entrepreneurs")
+    return stats
+
+
+# --- Partition Maintenance ---
+async def drop_empty_message_partitions(now: Optional[datetime] = None) -> List[str]:
+    """
+    Detaches and drops monthly partitions older than the current month that no
+    longer hold rows (their transcripts have all been archived).
+    """
+    now = now or utcnow()
+    current = message_partition_name(datetime(now.year, now.month, 1))
+    dropped = []
+
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'messages' AND c.relname LIKE 'messages\\_y%' "
+            "ORDER BY c.relname"
+        ))
+        partitions = [name for name in result.scalars().all() if name < current]
+
+        for name in partitions:
+            has_rows = await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})"))
+            if has_rows.scalar():
+                continue
+            await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+
+    if dropped:
+        logger.info(f"Dropped empty message partitions: {', '.join(dropped)}")
+    return dropped
+
+
+async def run_maintenance(older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS, batch_size: int = DEFAULT_BATCH_SIZE):
+    async with engine.begin() as conn:
+        await upgrade_schema(conn)
+        await ensure_message_partitions(conn)
+    stats = await archive_completed_transcripts(older_than_days, batch_size)
+    stats["dropped_partitions"] = len(await drop_empty_message_partitions())
+    stats["stale_checkpoints"] = await purge_stale_checkpoints()
+    return stats
+
+
+async def _convert_messages():
+    async with engine.begin() as conn:
+        await upgrade_schema(conn)
+        await convert_messages_to_partitioned(conn)
+    await engine.dispose()
+
+
+# --- CLI ---
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Archive completed transcripts, maintain message partitions and purge stale checkpoints.")
+    parser.add_argument("--older-than-days", type=int, default=DEFAULT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--convert-messages", action="store_true",
+        help="One-time upgrade: convert a legacy unpartitioned messages table, then exit.",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.convert_messages:
+        asyncio.run(_convert_messages())
+        return
+    stats = asyncio.run(run_maintenance(args.older_than_days, args.batch_size))
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
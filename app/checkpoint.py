@@ -0,0 +1,196 @@
+import os
+import zlib
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+    WRITES_IDX_MAP, get_checkpoint_id, get_checkpoint_metadata,
+)
+from app.database import AsyncSessionLocal, GraphCheckpoint, GraphCheckpointWrite, ProcessedTurn, utcnow
+
+# --- Settings ---
+# Serialized payloads at least this large are zlib-compressed (fastest level)
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "1024"))
+ZLIB_SUFFIX = "+zlib"
+
+
+class PostgresCheckpointSaver(BaseCheckpointSaver):
+    """
+    Async LangGraph checkpointer backed by the app's Postgres engine.
+
+    Only the latest checkpoint of each thread is kept: every step is a single
+    upsert of one msgpack row (compressed when large) instead of one row per
+    channel version, which is all a failed turn needs to resume.
+    """
+
+    def _pack(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= CHECKPOINT_COMPRESS_MIN_BYTES:
+            return type_ + ZLIB_SUFFIX, zlib.compress(data, 1)
+        return type_, data
+
+    def _unpack(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(ZLIB_SUFFIX):
+            type_, data = type_[:-len(ZLIB_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def _config(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    async def _load(self, session, row: GraphCheckpoint) -> CheckpointTuple:
+        writes = await session.execute(
+            select(GraphCheckpointWrite)
+            .where(
+                GraphCheckpointWrite.thread_id == row.thread_id,
+                GraphCheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id == row.checkpoint_id,
+            )
+            .order_by(GraphCheckpointWrite.task_id, GraphCheckpointWrite.idx)
+        )
+        return CheckpointTuple(
+            config=self._config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self._unpack(row.type, row.checkpoint),
+            metadata=self._unpack(row.metadata_type, row.checkpoint_metadata),
+            parent_config=(
+                self._config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id)
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[(w.task_id, w.channel, self._unpack(w.type, w.value)) for w in writes.scalars().all()],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        async with AsyncSessionLocal() as session:
+            row = await session.get(GraphCheckpoint, (thread_id, checkpoint_ns))
+            # Superseded checkpoints are not retained
+            if row is None or (checkpoint_id and row.checkpoint_id != checkpoint_id):
+                return None
+            return await self._load(session, row)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        query = select(GraphCheckpoint).order_by(GraphCheckpoint.thread_id, GraphCheckpoint.checkpoint_ns)
+        if config:
+            query = query.where(GraphCheckpoint.thread_id == config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query = query.where(GraphCheckpoint.checkpoint_ns == checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(GraphCheckpoint.checkpoint_id == checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query = query.where(GraphCheckpoint.checkpoint_id < before_id)
+
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(query)).scalars().all()
+            for row in rows:
+                if limit is not None and limit <= 0:
+                    break
+                result = await self._load(session, row)
+                if filter and not all(result.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                if limit is not None:
+                    limit -= 1
+                yield result
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self._pack(checkpoint)
+        meta_type, meta_data = self._pack(get_checkpoint_metadata(config, metadata))
+
+        values = {
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": data,
+            "metadata_type": meta_type,
+            "checkpoint_metadata": meta_data,
+            "updated_at": utcnow(),
+        }
+        async with AsyncSessionLocal() as session:
+            stmt = insert(GraphCheckpoint).values(thread_id=thread_id, checkpoint_ns=checkpoint_ns, **values)
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=["thread_id", "checkpoint_ns"],
+                set_=values,
+            ))
+            # Writes against the superseded checkpoint are no longer needed
+            await session.execute(delete(GraphCheckpointWrite).where(
+                GraphCheckpointWrite.thread_id == thread_id,
+                GraphCheckpointWrite.checkpoint_ns == checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id != checkpoint["id"],
+            ))
+            await session.commit()
+
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        async with AsyncSessionLocal() as session:
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                type_, data = self._pack(value)
+                stmt = insert(GraphCheckpointWrite).values(
+                    thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint_id,
+                    task_id=task_id, idx=idx, channel=channel, type=type_, value=data, task_path=task_path,
+                )
+                # Special writes (errors, interrupts) replace earlier ones; regular writes are idempotent
+                if idx < 0:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx"],
+                        set_={"channel": channel, "type": type_, "value": data},
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing()
+                await session.execute(stmt)
+            await session.commit()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(GraphCheckpointWrite).where(GraphCheckpointWrite.thread_id == thread_id))
+            await session.execute(delete(GraphCheckpoint).where(GraphCheckpoint.thread_id == thread_id))
+            await session.execute(delete(ProcessedTurn).where(ProcessedTurn.thread_id == thread_id))
+            await session.commit()
+
+
+async def purge_stale_checkpoints(older_than_hours: int = 24) -> int:
+    """
+    Deletes checkpoints of turns that were never completed nor retried.
+    """
+    cutoff = utcnow() - timedelta(hours=older_than_hours)
+    async with AsyncSessionLocal() as session:
+        stale = select(GraphCheckpoint.thread_id).where(GraphCheckpoint.updated_at < cutoff)
+        await session.execute(delete(GraphCheckpointWrite).where(GraphCheckpointWrite.thread_id.in_(stale)))
+        result = await session.execute(delete(GraphCheckpoint).where(GraphCheckpoint.updated_at < cutoff))
+        await session.execute(delete(ProcessedTurn).where(ProcessedTurn.created_at < cutoff))
+        await session.commit()
+    return result.rowcount
+
+
+checkpointer = PostgresCheckpointSaver()
@@ -0,0 +1,96 @@
+import os
+import time
+from uuid import uuid4
+from typing import Any, Dict
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from app import metrics
+
+# --- Pool Settings ---
+# Each uvicorn worker owns its own pool: the worst case number of Postgres
+# connections is workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Disable SQLAlchemy's pooling entirely (e.g. when PgBouncer already pools)
+DB_NULL_POOL = os.getenv("DB_NULL_POOL", "false").lower() == "true"
+# PgBouncer in transaction mode cannot keep named prepared statements across transactions
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "0" if DB_PGBOUNCER else "100"))
+
+metrics.describe("empiiu_db_pool_in_use", "gauge", "Connections currently checked out of the pool.")
+metrics.describe("empiiu_db_pool_idle", "gauge", "Idle connections held by the pool.")
+metrics.describe("empiiu_db_pool_overflow", "gauge", "Connections opened beyond pool_size.")
+metrics.describe("empiiu_db_pool_checkout_wait_seconds_sum", "counter", "Total time spent waiting for a pool checkout.")
+metrics.describe("empiiu_db_pool_checkout_wait_seconds_count", "counter", "Number of pool checkouts.")
+metrics.describe("empiiu_db_pool_checkout_wait_seconds_max", "gauge", "Longest pool checkout wait since start.")
+metrics.describe("empiiu_db_pool_checkout_timeouts_total", "counter", "Pool checkouts that hit DB_POOL_TIMEOUT.")
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long callers wait to check out a connection.
+
+    The wait includes opening a new connection when the pool has none idle
+    but may still grow (up to pool_size + max_overflow), so it measures the
+    full cost of a checkout rather than queueing alone.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.inc("empiiu_db_pool_checkout_timeouts_total")
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            metrics.inc("empiiu_db_pool_checkout_wait_seconds_sum", waited)
+            metrics.inc("empiiu_db_pool_checkout_wait_seconds_count")
+            if waited > metrics.get("empiiu_db_pool_checkout_wait_seconds_max"):
+                metrics.set_gauge("empiiu_db_pool_checkout_wait_seconds_max", waited)
+
+
+def engine_options() -> Dict[str, Any]:
+    """
+    Keyword arguments for create_async_engine built from the DB_* settings.
+    """
+    connect_args: Dict[str, Any] = {
+        # asyncpg's own statement cache and SQLAlchemy's prepared statement cache
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if DB_PGBOUNCER:
+        # Unique names avoid "prepared statement already exists" on shared server connections
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+    options: Dict[str, Any] = {"connect_args": connect_args, "pool_pre_ping": DB_POOL_PRE_PING}
+    if DB_NULL_POOL:
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def instrument_pool(engine):
+    """
+    Reads the pool usage gauges from the pool itself whenever /metrics renders.
+    """
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return
+
+    def collect():
+        metrics.set_gauge("empiiu_db_pool_in_use", pool.checkedout())
+        metrics.set_gauge("empiiu_db_pool_idle", pool.checkedin())
+        metrics.set_gauge("empiiu_db_pool_overflow", max(pool.overflow(), 0))
+
+    metrics.register_collector(collect)
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlalchemy import select
+from app.database import AsyncSessionLocal, Entrepreneur, Message, MessageArchive
+from app.archive import decompress_transcript
+
+# --- Settings ---
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 50000
+# Text encoders accumulate output up to this many bytes before yielding a chunk
+WRITE_BUFFER_BYTES = 64 * 1024
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+CSV_COLUMNS = ["id", "current_category", "question_count", "profile_data", "messages"]
+
+
+# --- Row Sources ---
+async def _entrepreneur_pages(chunk_size: int) -> AsyncIterator[List[Any]]:
+    """
+    Pages through entrepreneurs by keyset on the primary key, so each page is an
+    index range scan. Plain column rows are selected so nothing accumulates in
+    the identity map.
+    """
+    last_id = None
+    while True:
+        query = (
+            select(
+                Entrepreneur.id,
+                Entrepreneur.current_category,
+                Entrepreneur.question_count,
+                Entrepreneur.profile_data,
+            )
+            .order_by(Entrepreneur.id)
+            .limit(chunk_size)
+        )
+        if last_id is not None:
+            query = query.where(Entrepreneur.id > last_id)
+
+        async with AsyncSessionLocal() as session:
+            page = (await session.execute(query)).all()
+        if not page:
+            return
+        yield page
+        last_id = page[-1].id
+
+
+async def _transcripts_for(ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetches the transcripts of one page of entrepreneurs: archived messages first,
+    then those still in the hot table (read through ix_messages_entrepreneur_timestamp).
+    """
+    transcripts: Dict[str, List[Dict[str, Any]]] = {ent_id: [] for ent_id in ids}
+    async with AsyncSessionLocal() as session:
+        archives = await session.execute(
+            select(MessageArchive.entrepreneur_id, MessageArchive.transcript)
+            .where(MessageArchive.entrepreneur_id.in_(ids))
+        )
+        for row in archives:
+            transcripts[row.entrepreneur_id].extend(decompress_transcript(row.transcript))
+
+        messages = await session.stream(
+            select(Message.entrepreneur_id, Message.role, Message.content, Message.timestamp)
+            .where(Message.entrepreneur_id.in_(ids))
+            .order_by(Message.entrepreneur_id, Message.timestamp, Message.id)
+        )
+        async for row in messages:
+            transcripts[row.entrepreneur_id].append(_message_record(row))
+    return transcripts
+
+
+def _message_record(row) -> Dict[str, Any]:
+    return {
+        "role": row.role,
+        "content": row.content,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
+
+
+async def iter_entrepreneur_records(
+    include_messages: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields one dict per entrepreneur with its profile and, optionally, its transcript.
+    Only one page of entrepreneurs (and their transcripts) is held in memory.
+    """
+    async for page in _entrepreneur_pages(chunk_size):
+        transcripts = await _transcripts_for([row.id for row in page]) if include_messages else None
+        for row in page:
+            record = {
+                "id": row.id,
+                "current_category": row.current_category,
+                "question_count": row.question_count,
+                "profile_data": row.profile_data or {},
+            }
+            if include_messages:
+                record["messages"] = transcripts[row.id]
+            yield record
+
+
+# --- Encoders ---
+async def _encode_ndjson(records: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for record in records:
+        buffer += (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        if len(buffer) >= WRITE_BUFFER_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _encode_csv(
+    records: AsyncIterator[Dict[str, Any]],
+    include_messages: bool,
+) -> AsyncIterator[bytes]:
+    columns = CSV_COLUMNS if include_messages else CSV_COLUMNS[:-1]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writeheader()
+    async for record in records:
+        row = dict(record)
+        row["profile_data"] = json.dumps(row["profile_data"], ensure_ascii=False)
+        if include_messages:
+            row["messages"] = json.dumps(row["messages"], ensure_ascii=False)
+        writer.writerow(row)
+        if buffer.tell() >= WRITE_BUFFER_BYTES:
+            yield drain()
+    yield drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that hands written bytes back to the caller.
+    The absolute position is tracked separately so Parquet footer offsets stay valid.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _encode_parquet(
+    records: AsyncIterator[Dict[str, Any]],
+    include_messages: bool,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow (install the 'export' extra).") from e
+
+    fields = [
+        pa.field("id", pa.string()),
+        pa.field("current_category", pa.string()),
+        pa.field("question_count", pa.int64()),
+        pa.field("profile_data", pa.string()),
+    ]
+    if include_messages:
+        fields.append(pa.field("messages", pa.string()))
+    schema = pa.schema(fields)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    batch: Dict[str, List[Any]] = {name: [] for name in schema.names}
+
+    def flush():
+        writer.write_batch(pa.RecordBatch.from_pydict(batch, schema=schema))
+        for column in batch.values():
+            column.clear()
+
+    async for record in records:
+        batch["id"].append(record["id"])
+        batch["current_category"].append(record["current_category"])
+        batch["question_count"].append(record["question_count"])
+        batch["profile_data"].append(json.dumps(record["profile_data"], ensure_ascii=False))
+        if include_messages:
+            batch["messages"].append(json.dumps(record["messages"], ensure_ascii=False))
+
+        if len(batch["id"]) >= chunk_size:
+            flush()
+            yield sink.drain()
+
+    if batch["id"]:
+        flush()
+    writer.close()
+    yield sink.drain()
+
+
+async def export_entrepreneurs(
+    fmt: str = "ndjson",
+    include_messages: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Streams all entrepreneurs encoded as NDJSON, CSV or Parquet byte chunks.
+    Memory use is bounded by `chunk_size`, not by the number of rows exported.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    records = iter_entrepreneur_records(include_messages=include_messages, chunk_size=chunk_size)
+    if fmt == "ndjson":
+        encoder = _encode_ndjson(records)
+    elif fmt == "csv":
+        encoder = _encode_csv(records, include_messages)
+    else:
+        encoder = _encode_parquet(records, include_messages, chunk_size)
+
+    try:
+        async for chunk in encoder:
+            if chunk:
+                yield chunk
+    finally:
+        await encoder.aclose()
+        await records.aclose()
+
+
+# --- CLI ---
+async def _run_cli(fmt: str, include_messages: bool, chunk_size: int, output: Optional[str]):
+    out = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        async for chunk in export_entrepreneurs(fmt, include_messages, chunk_size):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+        else:
+            out.flush()
+
+
+def _chunk_size(value: str) -> int:
+    size = int(value)
+    if not 1 <= size <= MAX_CHUNK_SIZE:
+        raise argparse.ArgumentTypeError(f"must be between 1 and {MAX_CHUNK_SIZE}")
+    return size
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export entrepreneur profiles and transcripts.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--include-messages", action="store_true", help="Attach each entrepreneur's transcript.")
+    parser.add_argument("--chunk-size", type=_chunk_size, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output", "-o", help="Output file (defaults to stdout).")
+    args = parser.parse_args(argv)
+
+    asyncio.run(_run_cli(args.format, args.include_messages, args.chunk_size, args.output))
+
+
+if __name__ == "__main__":
+    main()
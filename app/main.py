@@ -1,10 +1,14 @@
 from fastapi import FastAPI, BackgroundTasks, HTTPException, Request, Query
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from app.models import WhatsAppWebhookPayload
-from app.agents import process_message
+from app.agents import process_message, complete_turn
 from app.utils import send_whatsapp_message
 from app.database import init_db
+from app import metrics
+from app.export import export_entrepreneurs, CONTENT_TYPES, EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
+import asyncio
+import hmac
 import logging
 import os
 import json
@@ -35,21 +39,39 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "meatyhamhock")
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+WORKER_RETRY_BACKOFF_SECONDS = float(os.getenv("WORKER_RETRY_BACKOFF_SECONDS", "2"))
 
-async def worker_process_message(entrepreneur_id: str, message_text: str, from_number: str):
+async def worker_process_message(entrepreneur_id: str, message_text: str, from_number: str, message_id: str):
     """
     Background worker that runs the LangGraph logic and sends the response.
+    Failed attempts are retried; each retry resumes the turn from its checkpoint.
     """
     logger.info(f"Worker processing message from {entrepreneur_id}")
+    delivered = False
+    for attempt in range(1, WORKER_MAX_ATTEMPTS + 1):
+        try:
+            # Run the Brain (LangGraph)
+            response_text = await process_message(entrepreneur_id, message_text, message_id)
+
+            # Send response via WhatsApp
+            await send_whatsapp_message(from_number, response_text)
+            delivered = True
+            break
+        except Exception as e:
+            logger.error(f"Error in worker process (attempt {attempt}/{WORKER_MAX_ATTEMPTS}): {e}")
+            if attempt < WORKER_MAX_ATTEMPTS:
+                await asyncio.sleep(WORKER_RETRY_BACKOFF_SECONDS * attempt)
+    if not delivered:
+        return
+
+    # The reply is already delivered: a cleanup failure must not trigger a resend.
+    # A leftover checkpoint is removed by the maintenance job.
     try:
-        # Run the Brain (LangGraph)
-        response_text = await process_message(entrepreneur_id, message_text)
-        
-        # Send response via WhatsApp
-        await send_whatsapp_message(from_number, response_text)
-        
+        await complete_turn(entrepreneur_id, message_id)
     except Exception as e:
-        logger.error(f"Error in worker process: {e}")
+        logger.error(f"Could not clear checkpoint for message {message_id}: {e}")
 
 @app.get("/api/v1/whatsapp/webhook")
 async def verify_webhook(
@@ -92,7 +114,8 @@ async def webhook_handler(payload: WhatsAppWebhookPayload, background_tasks: Bac
                             worker_process_message,
                             entrepreneur_id,
                             text_body,
-                            from_number
+                            from_number,
+                            message.id
                         )
     except Exception as e:
         logger.error(f"Error processing webhook: {e}")
@@ -101,6 +124,36 @@ async def webhook_handler(payload: WhatsAppWebhookPayload, background_tasks: Bac
 
     return {"status": "ok"}
 
+@app.get("/api/v1/export/entrepreneurs")
+async def export_entrepreneurs_handler(
+    request: Request,
+    format: str = Query("ndjson"),
+    include_messages: bool = Query(False),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE)
+):
+    """
+    Chunked download of every entrepreneur profile (and optionally its transcript).
+    Disabled unless EXPORT_TOKEN is set; clients send it in the X-Export-Token header.
+    """
+    provided = request.headers.get("X-Export-Token", "")
+    if not EXPORT_TOKEN or not hmac.compare_digest(provided.encode(), EXPORT_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Export not allowed")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+
+    return StreamingResponse(
+        export_entrepreneurs(format, include_messages, chunk_size),
+        media_type=CONTENT_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="entrepreneurs.{format}"'}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_handler():
+    """
+    Prometheus scrape endpoint for this worker's in-process metrics.
+    """
+    return metrics.render_prometheus()
+
 @app.get("/")
 async def root():
     return {"message": "Empiiu Onboarding System Running"}
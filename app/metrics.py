@@ -0,0 +1,71 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+
+# --- In-process metrics ---
+# Minimal counter/gauge registry rendered in the Prometheus text format at /metrics.
+# Values are per worker process; scrape each uvicorn worker or aggregate upstream.
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+_lock = Lock()
+_descriptions: Dict[str, Tuple[str, str]] = {}
+_values: Dict[str, Dict[LabelSet, float]] = defaultdict(dict)
+_collectors: List[Callable[[], None]] = []
+
+
+def describe(name: str, kind: str, help_text: str):
+    """
+    Registers a metric's type ('counter' or 'gauge') and help text.
+    """
+    _descriptions[name] = (kind, help_text)
+
+
+def register_collector(collector: Callable[[], None]):
+    """
+    Registers a callback run on every render, for gauges that are read from
+    their source (e.g. the DB pool) at scrape time instead of tracked by events.
+    """
+    _collectors.append(collector)
+
+
+def _labels(labels: Dict[str, str]) -> LabelSet:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, amount: float = 1.0, **labels):
+    key = _labels(labels)
+    with _lock:
+        series = _values[name]
+        series[key] = series.get(key, 0.0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _values[name][_labels(labels)] = value
+
+
+def get(name: str, **labels) -> float:
+    with _lock:
+        return _values.get(name, {}).get(_labels(labels), 0.0)
+
+
+def reset():
+    with _lock:
+        _values.clear()
+
+
+def render_prometheus() -> str:
+    for collector in _collectors:
+        collector()
+    lines = []
+    with _lock:
+        for name in sorted(_values):
+            if name in _descriptions:
+                kind, help_text = _descriptions[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(_values[name].items()):
+                label_str = ",".join(f'{k}="{v}"' for k, v in key)
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return "\n".join(lines) + "\n"
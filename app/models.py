@@ -19,6 +19,14 @@ class EntrepreneurState(BaseModel):
     last_message: Optional[str] = None
     question_count: int = 0
 
+# LLM Structured Output Schemas
+class AnalystOutput(BaseModel):
+    updated_profile_data: Dict[str, Any]
+    category_complete: bool
+
+class QuestionOutput(BaseModel):
+    question: str = Field(min_length=1)
+
 # WhatsApp Webhook Schemas
 class WhatsAppMessage(BaseModel):
     from_number: str = Field(alias="from")
@@ -0,0 +1,110 @@
+import logging
+from typing import List, Optional, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+metrics.describe(
+    "empiiu_llm_parse_total",
+    "counter",
+    "Structured LLM outputs by node and result (ok, repaired, failed).",
+)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def repair_candidates(text: str) -> List[str]:
+    """
+    Returns at most two cheap repairs for a malformed JSON object, in order of preference:
+    1. the first balanced object (drops trailing chatter), or the truncated text
+       with its open string and brackets closed;
+    2. the text cut back to the last complete member, then closed.
+    A single linear scan, no extra LLM call.
+    """
+    text = _strip_fences(text)
+    start = text.find("{")
+    if start == -1:
+        return []
+
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    safe_point = None  # (end index, stack snapshot) at the last complete member
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            safe_point = (i + 1, list(stack))
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return [text[start:i + 1]]
+        elif ch == ",":
+            safe_point = (i, list(stack))
+
+    # Truncated output: close whatever is still open
+    closed = text[start:]
+    if in_string:
+        if escape:
+            closed = closed[:-1]
+        closed += '"'
+    closed = closed.rstrip().rstrip(",")
+    if closed.endswith(":"):
+        closed += "null"
+    candidates = [closed + "".join(_CLOSERS[b] for b in reversed(stack))]
+
+    if safe_point is not None:
+        end, snapshot = safe_point
+        candidates.append(text[start:end] + "".join(_CLOSERS[b] for b in reversed(snapshot)))
+    return candidates
+
+
+def parse_structured(node: str, content: str, model: Type[T]) -> Optional[T]:
+    """
+    Validates an LLM response against `model`, falling back to bounded JSON repair.
+    Returns None (and counts a failure) when nothing validates.
+    """
+    try:
+        result = model.model_validate_json(content)
+        metrics.inc("empiiu_llm_parse_total", node=node, result="ok")
+        return result
+    except ValidationError:
+        pass
+
+    for candidate in repair_candidates(content):
+        try:
+            result = model.model_validate_json(candidate)
+        except ValidationError:
+            continue
+        metrics.inc("empiiu_llm_parse_total", node=node, result="repaired")
+        logger.info(f"Repaired malformed JSON output from {node}")
+        return result
+
+    metrics.inc("empiiu_llm_parse_total", node=node, result="failed")
+    logger.warning(f"Could not parse structured output from {node}: {content[:200]!r}")
+    return None
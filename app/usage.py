@@ -0,0 +1,173 @@
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, func
+from app import metrics
+from app.database import AsyncSessionLocal, LlmUsage, utcnow
+
+logger = logging.getLogger(__name__)
+
+# --- Budget Settings ---
+# 0 disables a budget. The per-user budget covers an entrepreneur's whole
+# onboarding; the global budget is a rolling window across all users.
+LLM_USER_TOKEN_BUDGET = int(os.getenv("LLM_USER_TOKEN_BUDGET", "0"))
+LLM_GLOBAL_TOKEN_BUDGET = int(os.getenv("LLM_GLOBAL_TOKEN_BUDGET", "0"))
+LLM_GLOBAL_BUDGET_WINDOW_HOURS = int(os.getenv("LLM_GLOBAL_BUDGET_WINDOW_HOURS", "24"))
+# How long a worker trusts its cached global window total before re-reading the
+# ledger. Tokens recorded by this worker are added to the cache in between, so
+# only other workers' usage can lag by up to this long.
+LLM_GLOBAL_BUDGET_CACHE_SECONDS = float(os.getenv("LLM_GLOBAL_BUDGET_CACHE_SECONDS", "30"))
+
+metrics.describe("empiiu_llm_tokens_total", "counter", "LLM tokens consumed by node and kind (prompt, completion).")
+metrics.describe("empiiu_llm_model_seconds_total", "counter", "Model time reported by Ollama, by node.")
+metrics.describe("empiiu_llm_budget_exceeded_total", "counter", "Turns degraded because a token budget was exhausted.")
+
+_TOTAL_TOKENS = LlmUsage.prompt_tokens + LlmUsage.completion_tokens
+
+# Cached global window total and the monotonic time it was read from the ledger
+_global_window: Dict[str, float] = {"tokens": 0, "read_at": float("-inf")}
+
+
+def reset_budget_cache():
+    _global_window.update(tokens=0, read_at=float("-inf"))
+
+
+def extract_usage(response: Any) -> Dict[str, Any]:
+    """
+    Reads token counts and model time from a chat response.
+    Prefers LangChain's usage_metadata, falling back to Ollama's raw counters.
+    """
+    meta = getattr(response, "response_metadata", None) or {}
+    usage = getattr(response, "usage_metadata", None) or {}
+    return {
+        "model": meta.get("model", ""),
+        "prompt_tokens": int(usage.get("input_tokens", meta.get("prompt_eval_count")) or 0),
+        "completion_tokens": int(usage.get("output_tokens", meta.get("eval_count")) or 0),
+        # Ollama reports durations in nanoseconds
+        "duration_ms": (meta.get("total_duration") or 0) / 1_000_000,
+    }
+
+
+async def record_usage(entrepreneur_id: str, node: str, response: Any):
+    usage = extract_usage(response)
+    metrics.inc("empiiu_llm_tokens_total", usage["prompt_tokens"], node=node, kind="prompt")
+    metrics.inc("empiiu_llm_tokens_total", usage["completion_tokens"], node=node, kind="completion")
+    metrics.inc("empiiu_llm_model_seconds_total", usage["duration_ms"] / 1000, node=node)
+
+    async with AsyncSessionLocal() as session:
+        session.add(LlmUsage(entrepreneur_id=entrepreneur_id, node=node, **usage))
+        await session.commit()
+    _global_window["tokens"] += usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+# --- Aggregate Queries ---
+async def usage_totals(entrepreneur_id: Optional[str] = None, since: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Total calls, tokens and model time, optionally for one entrepreneur and/or since a time.
+    """
+    query = select(
+        func.count(LlmUsage.id),
+        func.coalesce(func.sum(LlmUsage.prompt_tokens), 0),
+        func.coalesce(func.sum(LlmUsage.completion_tokens), 0),
+        func.coalesce(func.sum(LlmUsage.duration_ms), 0.0),
+    )
+    if entrepreneur_id is not None:
+        query = query.where(LlmUsage.entrepreneur_id == entrepreneur_id)
+    if since is not None:
+        query = query.where(LlmUsage.created_at >= since)
+
+    async with AsyncSessionLocal() as session:
+        calls, prompt, completion, duration = (await session.execute(query)).one()
+    return {
+        "calls": calls,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+        "duration_ms": float(duration),
+    }
+
+
+async def usage_by_node(entrepreneur_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    query = (
+        select(
+            LlmUsage.node,
+            func.count(LlmUsage.id),
+            func.sum(LlmUsage.prompt_tokens),
+            func.sum(LlmUsage.completion_tokens),
+            func.sum(LlmUsage.duration_ms),
+        )
+        .group_by(LlmUsage.node)
+    )
+    if entrepreneur_id is not None:
+        query = query.where(LlmUsage.entrepreneur_id == entrepreneur_id)
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(query)).all()
+    return {
+        node: {
+            "calls": calls,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "duration_ms": float(duration),
+        }
+        for node, calls, prompt, completion, duration in rows
+    }
+
+
+async def top_consumers(limit: int = 10, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Entrepreneurs ranked by total tokens consumed.
+    """
+    total = func.sum(_TOTAL_TOKENS).label("total_tokens")
+    query = select(LlmUsage.entrepreneur_id, total).group_by(LlmUsage.entrepreneur_id).order_by(total.desc()).limit(limit)
+    if since is not None:
+        query = query.where(LlmUsage.created_at >= since)
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(query)).all()
+    return [{"entrepreneur_id": ent_id, "total_tokens": tokens} for ent_id, tokens in rows]
+
+
+# --- Budget Enforcement ---
+async def _global_window_tokens(session) -> int:
+    """
+    Tokens used by all entrepreneurs within the rolling window, re-read from the
+    ledger at most every LLM_GLOBAL_BUDGET_CACHE_SECONDS.
+    """
+    now = time.monotonic()
+    if now - _global_window["read_at"] >= LLM_GLOBAL_BUDGET_CACHE_SECONDS:
+        since = utcnow() - timedelta(hours=LLM_GLOBAL_BUDGET_WINDOW_HOURS)
+        tokens = await session.scalar(
+            select(func.coalesce(func.sum(_TOTAL_TOKENS), 0)).where(LlmUsage.created_at >= since)
+        )
+        _global_window.update(tokens=tokens, read_at=now)
+    return _global_window["tokens"]
+
+
+async def exceeded_budget(entrepreneur_id: str) -> Optional[str]:
+    """
+    Returns 'user' or 'global' when the matching budget is exhausted, else None.
+    """
+    async with AsyncSessionLocal() as session:
+        if LLM_USER_TOKEN_BUDGET > 0:
+            used = await session.scalar(
+                select(func.coalesce(func.sum(_TOTAL_TOKENS), 0)).where(LlmUsage.entrepreneur_id == entrepreneur_id)
+            )
+            if used >= LLM_USER_TOKEN_BUDGET:
+                scope = "user"
+                metrics.inc("empiiu_llm_budget_exceeded_total", scope=scope)
+                logger.warning(f"Token budget exhausted for {entrepreneur_id}: {used}/{LLM_USER_TOKEN_BUDGET}")
+                return scope
+
+        if LLM_GLOBAL_TOKEN_BUDGET > 0:
+            used = await _global_window_tokens(session)
+            if used >= LLM_GLOBAL_TOKEN_BUDGET:
+                scope = "global"
+                metrics.inc("empiiu_llm_budget_exceeded_total", scope=scope)
+                logger.warning(f"Global token budget exhausted: {used}/{LLM_GLOBAL_TOKEN_BUDGET}")
+                return scope
+
+    return None
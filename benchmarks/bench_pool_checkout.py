@@ -0,0 +1,83 @@
+"""
+Pool checkout latency under concurrent load.
+
+Runs `--concurrency` tasks that each check out a connection, hold it for
+`--hold-ms` (simulating a query), and release it, `--iterations` times.
+Checkout latency is measured around `engine.connect()`, so it includes
+opening a new connection whenever the pool has to grow (and pre-ping, when
+enabled); the "new connections" line shows how many checkouts paid for that.
+Tune the pool with the same DB_* environment variables the app reads, e.g.:
+
+    DB_POOL_SIZE=5 DB_MAX_OVERFLOW=0 PYTHONPATH=. uv run python benchmarks/bench_pool_checkout.py --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+from collections import Counter
+import time
+from sqlalchemy import event, text
+from app import metrics
+from app.database import engine
+from app.db_pool import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_NULL_POOL
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def worker(iterations: int, hold_seconds: float, latencies: list):
+    for _ in range(iterations):
+        start = time.perf_counter()
+        async with engine.connect() as conn:
+            latencies.append(time.perf_counter() - start)
+            await conn.execute(text("SELECT pg_sleep(:s)"), {"s": hold_seconds})
+
+
+async def run(concurrency: int, iterations: int, hold_ms: float):
+    # Warm up: the first connection also pays for dialect initialisation
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    metrics.reset()
+    connects = []
+    event.listen(engine.sync_engine.pool, "connect", lambda *args: connects.append(1))
+
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(worker(iterations, hold_ms / 1000, latencies) for _ in range(concurrency)),
+        return_exceptions=True
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+
+    pool = "NullPool" if DB_NULL_POOL else f"pool_size={DB_POOL_SIZE} max_overflow={DB_MAX_OVERFLOW}"
+    ms = [l * 1000 for l in latencies]
+    if not ms:
+        print(f"{pool} concurrency={concurrency}: no successful checkouts")
+    else:
+        print(f"{pool} concurrency={concurrency} checkouts={len(ms)} elapsed={elapsed:.2f}s throughput={len(ms) / elapsed:.1f}/s")
+        print(
+            f"checkout ms: mean={statistics.mean(ms):.2f} p50={percentile(ms, 50):.2f} "
+            f"p95={percentile(ms, 95):.2f} p99={percentile(ms, 99):.2f} max={max(ms):.2f}"
+        )
+    print(f"new connections opened during run: {len(connects)}")
+    print(f"checkout timeouts: {int(metrics.get('empiiu_db_pool_checkout_timeouts_total'))}")
+    print(f"failed tasks: {len(errors)}/{concurrency}")
+    for name, count in Counter(type(e).__name__ for e in errors).most_common():
+        print(f"  {name}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DB pool checkout latency under load.")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--hold-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.iterations, args.hold_ms))
+
+
+if __name__ == "__main__":
+    main()
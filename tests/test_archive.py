@@ -0,0 +1,149 @@
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.archive import archive_completed_transcripts, compress_transcript, decompress_transcript, drop_empty_message_partitions
+from app.database import (
+    AsyncSessionLocal, Entrepreneur, Message, MessageArchive, Base, engine as db_engine,
+    ensure_message_partitions, upgrade_schema, convert_messages_to_partitioned, messages_is_partitioned,
+)
+from app.export import iter_entrepreneur_records
+
+NOW = datetime(2026, 3, 15)
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_message_partitions(conn, months_ahead=1, now=datetime(2026, 1, 1))
+
+    async with AsyncSessionLocal() as session:
+        session.add_all([
+            Entrepreneur(id="old_done", current_category="COMPLETED", completed_at=NOW - timedelta(days=40)),
+            Entrepreneur(id="new_done", current_category="COMPLETED", completed_at=NOW - timedelta(days=2)),
+            Entrepreneur(id="active", current_category="SALES"),
+        ])
+        await session.commit()
+        for ent_id in ("old_done", "new_done", "active"):
+            session.add(Message(entrepreneur_id=ent_id, role="user", content="Hola", timestamp=datetime(2026, 1, 10)))
+            session.add(Message(entrepreneur_id=ent_id, role="assistant", content="¿Y su negocio?", timestamp=datetime(2026, 1, 10, 0, 1)))
+        await session.commit()
+    yield
+
+async def hot_count(ent_id):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(func.count()).select_from(Message).where(Message.entrepreneur_id == ent_id))
+        return result.scalar()
+
+def test_transcript_compression_roundtrip():
+    transcript = [{"role": "user", "content": "Hola " * 50, "timestamp": "2026-01-10T00:00:00"}]
+    blob = compress_transcript(transcript)
+    assert len(blob) < len("Hola " * 50)
+    assert decompress_transcript(blob) == transcript
+
+@pytest.mark.asyncio
+async def test_only_old_completed_transcripts_are_archived():
+    stats = await archive_completed_transcripts(older_than_days=30, now=NOW)
+
+    assert stats == {"entrepreneurs": 1, "messages": 2}
+    assert await hot_count("old_done") == 0
+    assert await hot_count("new_done") == 2
+    assert await hot_count("active") == 2
+
+    async with AsyncSessionLocal() as session:
+        archive = await session.get(MessageArchive, "old_done")
+        assert archive.message_count == 2
+        assert [m["content"] for m in decompress_transcript(archive.transcript)] == ["Hola", "¿Y su negocio?"]
+
+@pytest.mark.asyncio
+async def test_message_committed_during_archival_is_not_lost(monkeypatch):
+    original_execute = AsyncSession.execute
+    interleaved = []
+
+    async def execute(self, statement, *args, **kwargs):
+        # Another worker commits a reply right before the archive DELETE runs
+        if getattr(statement, "is_delete", False) and statement.table.name == "messages" and not interleaved:
+            interleaved.append(True)
+            async with AsyncSessionLocal() as other:
+                other.add(Message(entrepreneur_id="old_done", role="user", content="Sigo aquí", timestamp=datetime(2026, 1, 20)))
+                await other.commit()
+        return await original_execute(self, statement, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncSession, "execute", execute)
+    await archive_completed_transcripts(older_than_days=30, now=NOW)
+
+    async with AsyncSessionLocal() as session:
+        hot = (await session.execute(select(Message.content).where(Message.entrepreneur_id == "old_done"))).scalars().all()
+        archive = await session.get(MessageArchive, "old_done")
+    archived = [m["content"] for m in decompress_transcript(archive.transcript)]
+    assert interleaved
+    assert sorted(hot + archived) == sorted(["Hola", "¿Y su negocio?", "Sigo aquí"])
+    assert archive.message_count == len(archived)
+
+@pytest.mark.asyncio
+async def test_archived_transcripts_remain_exportable():
+    await archive_completed_transcripts(older_than_days=30, now=NOW)
+
+    records = {r["id"]: r async for r in iter_entrepreneur_records(include_messages=True)}
+    assert [m["content"] for m in records["old_done"]["messages"]] == ["Hola", "¿Y su negocio?"]
+    assert len(records["active"]["messages"]) == 2
+
+@pytest.mark.asyncio
+async def test_empty_partitions_are_dropped():
+    await archive_completed_transcripts(older_than_days=0, now=NOW)
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("DELETE FROM messages WHERE entrepreneur_id = 'active'"))
+        await session.commit()
+
+    dropped = await drop_empty_message_partitions(now=NOW)
+    assert dropped == ["messages_y2026m01", "messages_y2026m02"]
+
+@pytest.mark.asyncio
+async def test_partition_creation_moves_rows_out_of_default():
+    async with AsyncSessionLocal() as session:
+        session.add(Message(entrepreneur_id="active", role="user", content="Marzo", timestamp=datetime(2026, 3, 5)))
+        await session.commit()
+
+    async with db_engine.begin() as conn:
+        await ensure_message_partitions(conn, months_ahead=0, now=NOW)
+        in_march = await conn.execute(text("SELECT count(*) FROM messages_y2026m03"))
+        in_default = await conn.execute(text("SELECT count(*) FROM messages_default"))
+        assert in_march.scalar() == 1
+        assert in_default.scalar() == 0
+    assert await hot_count("active") == 3
+
+@pytest.mark.asyncio
+async def test_upgrade_adds_and_backfills_completed_at():
+    async with db_engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE entrepreneurs DROP COLUMN completed_at"))
+        await upgrade_schema(conn)
+        await upgrade_schema(conn)
+
+    async with AsyncSessionLocal() as session:
+        ent = await session.get(Entrepreneur, "old_done")
+        assert ent.completed_at == datetime(2026, 1, 10, 0, 1)
+        assert (await session.get(Entrepreneur, "active")).completed_at is None
+
+@pytest.mark.asyncio
+async def test_legacy_messages_table_is_converted():
+    async with db_engine.begin() as conn:
+        await conn.execute(text("DROP TABLE messages CASCADE"))
+        await conn.execute(text(
+            "CREATE TABLE messages (id SERIAL PRIMARY KEY, entrepreneur_id VARCHAR REFERENCES entrepreneurs(id), "
+            "role VARCHAR, content VARCHAR, timestamp TIMESTAMP WITHOUT TIME ZONE)"
+        ))
+        await conn.execute(text(
+            "INSERT INTO messages (entrepreneur_id, role, content, timestamp) VALUES "
+            "('active', 'user', 'Viejo', '2025-11-02'), ('active', 'assistant', 'Nuevo', '2026-01-03')"
+        ))
+        await convert_messages_to_partitioned(conn)
+        assert await messages_is_partitioned(conn)
+        in_november = await conn.execute(text("SELECT count(*) FROM messages_y2025m11"))
+        assert in_november.scalar() == 1
+
+    async with AsyncSessionLocal() as session:
+        session.add(Message(entrepreneur_id="active", role="user", content="Después"))
+        await session.commit()
+    assert await hot_count("active") == 3
@@ -0,0 +1,159 @@
+import json
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, patch
+from langchain_core.messages import AIMessage
+from sqlalchemy import select
+from app import checkpoint as checkpoint_module
+from app.agents import app_graph, process_message, complete_turn, turn_thread_id
+from app.checkpoint import checkpointer
+from app.database import AsyncSessionLocal, Entrepreneur, Message, GraphCheckpoint, ProcessedTurn, Base, engine as db_engine
+
+ENT_ID = "573005555555"
+MSG_ID = "wamid.retry"
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+def make_llm(fail_generator_times=0):
+    calls = {"analyst": 0, "generator": 0}
+
+    async def mocked_llm_invoke(messages, **kwargs):
+        if "Business Analyst" in messages[0].content:
+            calls["analyst"] += 1
+            return AIMessage(content=json.dumps({"updated_profile_data": {"name": "Café"}, "category_complete": False}))
+        calls["generator"] += 1
+        if calls["generator"] <= fail_generator_times:
+            raise ConnectionError("Ollama unavailable")
+        return AIMessage(content=json.dumps({"question": "¿Cuánto lleva vendiendo?"}))
+
+    mock_llm = AsyncMock()
+    mock_llm.ainvoke.side_effect = mocked_llm_invoke
+    return mock_llm, calls
+
+async def stored_messages():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Message).where(Message.entrepreneur_id == ENT_ID).order_by(Message.timestamp))
+        return [(m.role, m.content) for m in result.scalars().all()]
+
+@pytest.mark.asyncio
+async def test_failed_turn_resumes_without_rerunning_analysis():
+    mock_llm, calls = make_llm(fail_generator_times=1)
+
+    with patch("app.agents.llm", mock_llm):
+        with pytest.raises(ConnectionError):
+            await process_message(ENT_ID, "Hola", MSG_ID)
+        reply = await process_message(ENT_ID, "Hola", MSG_ID)
+
+    assert reply == "¿Cuánto lleva vendiendo?"
+    assert calls == {"analyst": 1, "generator": 2}
+    assert await stored_messages() == [("user", "Hola"), ("assistant", "¿Cuánto lleva vendiendo?")]
+
+    async with AsyncSessionLocal() as session:
+        ent = (await session.execute(select(Entrepreneur).where(Entrepreneur.id == ENT_ID))).scalars().first()
+        assert ent.profile_data == {"name": "Café"}
+        assert ent.question_count == 1
+
+@pytest.mark.asyncio
+async def test_completed_turn_is_replayed_until_acknowledged():
+    mock_llm, calls = make_llm()
+
+    with patch("app.agents.llm", mock_llm):
+        first = await process_message(ENT_ID, "Hola", MSG_ID)
+        # e.g. the WhatsApp send failed and the worker retries
+        second = await process_message(ENT_ID, "Hola", MSG_ID)
+
+    assert first == second
+    assert calls == {"analyst": 1, "generator": 1}
+    assert len(await stored_messages()) == 2
+
+    await complete_turn(ENT_ID, MSG_ID)
+    async with AsyncSessionLocal() as session:
+        assert await session.get(GraphCheckpoint, (turn_thread_id(ENT_ID, MSG_ID), "")) is None
+
+@pytest.mark.asyncio
+async def test_turn_without_message_id_leaves_no_checkpoint():
+    mock_llm, _ = make_llm()
+    with patch("app.agents.llm", mock_llm):
+        await process_message(ENT_ID, "Hola")
+
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(GraphCheckpoint))).scalars().all() == []
+
+@pytest.mark.asyncio
+async def test_large_checkpoints_are_compressed(monkeypatch):
+    monkeypatch.setattr(checkpoint_module, "CHECKPOINT_COMPRESS_MIN_BYTES", 64)
+    mock_llm, _ = make_llm()
+    with patch("app.agents.llm", mock_llm):
+        await process_message(ENT_ID, "Hola " * 100, MSG_ID)
+
+    config = {"configurable": {"thread_id": turn_thread_id(ENT_ID, MSG_ID)}}
+    async with AsyncSessionLocal() as session:
+        row = await session.get(GraphCheckpoint, (turn_thread_id(ENT_ID, MSG_ID), ""))
+        assert row.type.endswith("+zlib")
+
+    saved = await checkpointer.aget_tuple(config)
+    assert saved.checkpoint["channel_values"]["generated_question"] == "¿Cuánto lleva vendiendo?"
+
+@pytest.mark.asyncio
+async def test_failed_persist_stores_nothing_until_retry():
+    mock_llm, calls = make_llm()
+
+    with patch("app.agents.llm", mock_llm):
+        with patch("app.database._apply_entrepreneur_state", side_effect=RuntimeError("db error")):
+            with pytest.raises(RuntimeError):
+                await process_message(ENT_ID, "Hola", MSG_ID)
+        assert await stored_messages() == []
+
+        await process_message(ENT_ID, "Hola", MSG_ID)
+
+    assert calls == {"analyst": 1, "generator": 1}
+    assert await stored_messages() == [("user", "Hola"), ("assistant", "¿Cuánto lleva vendiendo?")]
+
+@pytest.mark.asyncio
+async def test_persist_rerun_after_lost_checkpoint_stores_once():
+    from app import database
+
+    mock_llm, calls = make_llm()
+    original_save_turn = database.save_turn
+    original_put, original_put_writes = checkpointer.aput, checkpointer.aput_writes
+    outage = {"active": False, "happened": False}
+
+    # The database goes away right after persist_turn commits, before its checkpoint is saved
+    async def save_turn(*args, **kwargs):
+        stored = await original_save_turn(*args, **kwargs)
+        if not outage["happened"]:
+            outage.update(active=True, happened=True)
+        return stored
+
+    async def aput(*args, **kwargs):
+        if outage["active"]:
+            raise ConnectionError("checkpoint write failed")
+        return await original_put(*args, **kwargs)
+
+    async def aput_writes(*args, **kwargs):
+        if outage["active"]:
+            raise ConnectionError("checkpoint write failed")
+        return await original_put_writes(*args, **kwargs)
+
+    with patch("app.agents.llm", mock_llm), patch("app.database.save_turn", save_turn), \
+            patch.object(checkpointer, "aput", aput), patch.object(checkpointer, "aput_writes", aput_writes):
+        with pytest.raises(ConnectionError):
+            await process_message(ENT_ID, "Hola", MSG_ID)
+        outage["active"] = False
+        snapshot = await app_graph.aget_state({"configurable": {"thread_id": turn_thread_id(ENT_ID, MSG_ID)}})
+        assert snapshot.next == ("persist_turn",)
+
+        reply = await process_message(ENT_ID, "Hola", MSG_ID)
+
+    assert reply == "¿Cuánto lleva vendiendo?"
+    assert calls == {"analyst": 1, "generator": 1}
+    assert await stored_messages() == [("user", "Hola"), ("assistant", "¿Cuánto lleva vendiendo?")]
+
+    await complete_turn(ENT_ID, MSG_ID)
+    async with AsyncSessionLocal() as session:
+        assert await session.get(ProcessedTurn, turn_thread_id(ENT_ID, MSG_ID)) is None
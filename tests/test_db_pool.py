@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+from app import db_pool, metrics
+from app.database import engine as db_engine
+
+def test_engine_options_default_pool(monkeypatch):
+    monkeypatch.setattr(db_pool, "DB_NULL_POOL", False)
+    monkeypatch.setattr(db_pool, "DB_PGBOUNCER", False)
+    monkeypatch.setattr(db_pool, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(db_pool, "DB_STATEMENT_CACHE_SIZE", 100)
+
+    options = db_pool.engine_options()
+    assert options["poolclass"] is db_pool.InstrumentedQueuePool
+    assert options["pool_size"] == 7
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"]["statement_cache_size"] == 100
+    assert "prepared_statement_name_func" not in options["connect_args"]
+
+def test_engine_options_pgbouncer(monkeypatch):
+    monkeypatch.setattr(db_pool, "DB_NULL_POOL", True)
+    monkeypatch.setattr(db_pool, "DB_PGBOUNCER", True)
+    monkeypatch.setattr(db_pool, "DB_STATEMENT_CACHE_SIZE", 0)
+
+    options = db_pool.engine_options()
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+    name_func = options["connect_args"]["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+@pytest.mark.asyncio
+async def test_pool_gauges_are_read_at_render():
+    metrics.reset()
+    async with db_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        assert "empiiu_db_pool_in_use 1" in metrics.render_prometheus()
+    rendered = metrics.render_prometheus()
+    assert "empiiu_db_pool_in_use 0" in rendered
+    assert "empiiu_db_pool_idle " in rendered
+    assert metrics.get("empiiu_db_pool_checkout_wait_seconds_count") >= 1
@@ -0,0 +1,89 @@
+import pytest
+import pytest_asyncio
+import csv
+import io
+import json
+from app.database import AsyncSessionLocal, Entrepreneur, Message, Base, engine as db_engine
+from app.export import export_entrepreneurs, iter_entrepreneur_records, main as export_main
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as session:
+        session.add_all([
+            Entrepreneur(id="573001", current_category="MARKETING", profile_data={"name": "Café"}, question_count=4),
+            Entrepreneur(id="573002", current_category="IDEATION", profile_data={}, question_count=0),
+            Entrepreneur(id="573003", current_category="COMPLETED", profile_data={"team": 2}, question_count=16),
+        ])
+        await session.commit()
+        session.add_all([
+            Message(entrepreneur_id="573001", role="user", content="Hola"),
+            Message(entrepreneur_id="573001", role="assistant", content="¿Cómo se llama su negocio?"),
+            Message(entrepreneur_id="573003", role="user", content="Listo"),
+        ])
+        await session.commit()
+    yield
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+@pytest.mark.asyncio
+async def test_records_attach_transcripts_in_order():
+    records = [r async for r in iter_entrepreneur_records(include_messages=True, chunk_size=2)]
+
+    assert [r["id"] for r in records] == ["573001", "573002", "573003"]
+    assert [m["content"] for m in records[0]["messages"]] == ["Hola", "¿Cómo se llama su negocio?"]
+    assert records[1]["messages"] == []
+    assert [m["role"] for m in records[2]["messages"]] == ["user"]
+
+@pytest.mark.asyncio
+async def test_ndjson_export_without_messages():
+    body = await collect(export_entrepreneurs("ndjson", include_messages=False, chunk_size=1))
+    lines = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+    assert len(lines) == 3
+    assert lines[0]["profile_data"] == {"name": "Café"}
+    assert "messages" not in lines[0]
+
+@pytest.mark.asyncio
+async def test_csv_export_with_messages():
+    body = await collect(export_entrepreneurs("csv", include_messages=True))
+    rows = list(csv.DictReader(io.StringIO(body.decode("utf-8"))))
+
+    assert len(rows) == 3
+    assert json.loads(rows[2]["profile_data"]) == {"team": 2}
+    assert len(json.loads(rows[0]["messages"])) == 2
+
+@pytest.mark.asyncio
+async def test_parquet_export_roundtrip():
+    pq = pytest.importorskip("pyarrow.parquet")
+    body = await collect(export_entrepreneurs("parquet", include_messages=True, chunk_size=2))
+    table = pq.read_table(io.BytesIO(body))
+
+    assert table.num_rows == 3
+    assert table.column("question_count").to_pylist() == [4, 0, 16]
+
+@pytest.mark.asyncio
+async def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        await collect(export_entrepreneurs("xml"))
+
+@pytest.mark.parametrize("chunk_size", ["0", "-5", "50001"])
+def test_cli_rejects_invalid_chunk_size(chunk_size):
+    with pytest.raises(SystemExit) as exc:
+        export_main(["--chunk-size", chunk_size])
+    assert exc.value.code == 2
+
+@pytest.mark.asyncio
+async def test_invalid_chunk_size_rejected():
+    with pytest.raises(ValueError):
+        await collect(export_entrepreneurs("csv", chunk_size=0))
+
+@pytest.mark.asyncio
+async def test_text_exports_are_buffered():
+    chunks = [chunk async for chunk in export_entrepreneurs("ndjson", include_messages=True, chunk_size=1)]
+    assert len(chunks) == 1
+    assert chunks[0].count(b"\n") == 3
@@ -48,7 +48,7 @@ async def test_full_onboarding_flow():
     analyst_calls = 0
     generator_calls = 0
     
-    async def mocked_llm_invoke(messages):
+    async def mocked_llm_invoke(messages, **kwargs):
         nonlocal analyst_calls, generator_calls
         import json
         from langchain_core.messages import AIMessage
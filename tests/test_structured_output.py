@@ -0,0 +1,38 @@
+import pytest
+from app import metrics
+from app.models import AnalystOutput, QuestionOutput
+from app.structured_output import parse_structured, repair_candidates
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+
+def test_valid_output_parses_without_repair():
+    result = parse_structured("business_analyst", '{"updated_profile_data": {"name": "Café"}, "category_complete": true}', AnalystOutput)
+    assert result.updated_profile_data == {"name": "Café"}
+    assert result.category_complete is True
+    assert metrics.get("empiiu_llm_parse_total", node="business_analyst", result="ok") == 1
+
+def test_truncated_string_is_closed():
+    result = parse_structured("question_generator", '{"question": "¿Cuánto tiempo lleva vendiendo', QuestionOutput)
+    assert result.question == "¿Cuánto tiempo lleva vendiendo"
+    assert metrics.get("empiiu_llm_parse_total", node="question_generator", result="repaired") == 1
+
+def test_truncated_member_is_dropped():
+    content = '{"category_complete": false, "updated_profile_data": {"name": "Café", "sect'
+    result = parse_structured("business_analyst", content, AnalystOutput)
+    assert result.updated_profile_data == {"name": "Café"}
+
+def test_trailing_text_and_fences_are_ignored():
+    content = '```json\n{"question": "¿Quiénes son sus clientes?"}\n```'
+    assert parse_structured("question_generator", content, QuestionOutput).question == "¿Quiénes son sus clientes?"
+
+def test_unrepairable_output_counts_failure():
+    assert parse_structured("question_generator", "Lo siento, no puedo ayudar.", QuestionOutput) is None
+    assert parse_structured("question_generator", '{"question": ""}', QuestionOutput) is None
+    assert metrics.get("empiiu_llm_parse_total", node="question_generator", result="failed") == 2
+
+def test_repair_is_bounded():
+    assert len(repair_candidates('{"a": [1, {"b": "c')) <= 2
+    assert repair_candidates("sin json") == []
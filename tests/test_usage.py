@@ -0,0 +1,106 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, patch
+from langchain_core.messages import AIMessage
+from app import usage
+from app.agents import process_message, BUDGET_CLOSING_MESSAGE, BUDGET_RETRY_MESSAGE
+from app.database import AsyncSessionLocal, Entrepreneur, LlmUsage, Base, engine as db_engine
+from sqlalchemy import select
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        session.add_all([
+            Entrepreneur(id="573001"),
+            Entrepreneur(id="573002", current_category="SALES", profile_data={"name": "Tienda"}, question_count=4),
+        ])
+        await session.commit()
+    usage.reset_budget_cache()
+    yield
+
+def ollama_response(content, prompt_tokens, completion_tokens):
+    return AIMessage(
+        content=content,
+        response_metadata={"model": "llama3", "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens, "total_duration": 250_000_000},
+    )
+
+def test_extract_usage_from_ollama_metadata():
+    result = usage.extract_usage(ollama_response("{}", 120, 30))
+    assert result == {"model": "llama3", "prompt_tokens": 120, "completion_tokens": 30, "duration_ms": 250.0}
+
+def test_extract_usage_without_metadata():
+    result = usage.extract_usage(AIMessage(content="{}"))
+    assert result["prompt_tokens"] == 0 and result["completion_tokens"] == 0
+
+@pytest.mark.asyncio
+async def test_aggregates_by_entrepreneur_and_node():
+    await usage.record_usage("573001", "business_analyst", ollama_response("{}", 100, 20))
+    await usage.record_usage("573001", "question_generator", ollama_response("{}", 80, 10))
+    await usage.record_usage("573002", "business_analyst", ollama_response("{}", 50, 5))
+
+    totals = await usage.usage_totals("573001")
+    assert totals["calls"] == 2
+    assert totals["total_tokens"] == 210
+    assert totals["duration_ms"] == 500.0
+
+    by_node = await usage.usage_by_node()
+    assert by_node["business_analyst"]["prompt_tokens"] == 150
+
+    top = await usage.top_consumers(limit=1)
+    assert top == [{"entrepreneur_id": "573001", "total_tokens": 210}]
+
+@pytest.mark.asyncio
+async def test_user_budget_switches_to_deterministic_closing(monkeypatch):
+    monkeypatch.setattr(usage, "LLM_USER_TOKEN_BUDGET", 100)
+    await usage.record_usage("573001", "business_analyst", ollama_response("{}", 90, 20))
+
+    mock_llm = AsyncMock()
+    with patch("app.agents.llm", mock_llm):
+        reply = await process_message("573001", "Hola otra vez")
+
+    assert reply == BUDGET_CLOSING_MESSAGE
+    mock_llm.ainvoke.assert_not_called()
+    async with AsyncSessionLocal() as session:
+        ent = (await session.execute(select(Entrepreneur).where(Entrepreneur.id == "573001"))).scalars().first()
+        assert ent.current_category == "COMPLETED"
+
+@pytest.mark.asyncio
+async def test_global_budget(monkeypatch):
+    monkeypatch.setattr(usage, "LLM_GLOBAL_TOKEN_BUDGET", 100)
+    assert await usage.exceeded_budget("573002") is None
+    await usage.record_usage("573001", "business_analyst", ollama_response("{}", 90, 20))
+    assert await usage.exceeded_budget("573002") == "global"
+
+@pytest.mark.asyncio
+async def test_global_budget_total_is_cached(monkeypatch):
+    monkeypatch.setattr(usage, "LLM_GLOBAL_TOKEN_BUDGET", 100)
+    assert await usage.exceeded_budget("573002") is None
+
+    # Usage recorded by another worker is only seen once the cache expires
+    async with AsyncSessionLocal() as session:
+        session.add(LlmUsage(entrepreneur_id="573001", node="business_analyst", model="llama3", prompt_tokens=150, completion_tokens=0, duration_ms=0))
+        await session.commit()
+    assert await usage.exceeded_budget("573002") is None
+
+    monkeypatch.setattr(usage, "LLM_GLOBAL_BUDGET_CACHE_SECONDS", 0)
+    assert await usage.exceeded_budget("573002") == "global"
+
+@pytest.mark.asyncio
+async def test_global_budget_turn_keeps_category(monkeypatch):
+    monkeypatch.setattr(usage, "LLM_GLOBAL_TOKEN_BUDGET", 100)
+    await usage.record_usage("573001", "business_analyst", ollama_response("{}", 90, 20))
+
+    mock_llm = AsyncMock()
+    with patch("app.agents.llm", mock_llm):
+        reply = await process_message("573002", "Vendemos por Instagram")
+
+    assert reply == BUDGET_RETRY_MESSAGE
+    mock_llm.ainvoke.assert_not_called()
+    async with AsyncSessionLocal() as session:
+        ent = (await session.execute(select(Entrepreneur).where(Entrepreneur.id == "573002"))).scalars().first()
+        assert ent.current_category == "SALES"
+        assert ent.question_count == 4
+        assert ent.completed_at is None